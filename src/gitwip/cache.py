@@ -0,0 +1,142 @@
+"""Persistent cache of the refs read from each repository."""
+
+import json
+import os
+from pathlib import Path
+from typing import TypedDict
+
+CACHE_VERSION = 1
+
+
+class CacheEntry(TypedDict):
+    """Cached refs of a single repository."""
+
+    key: list[int]
+    branches: list[str]
+    primary: str | None
+
+
+def get_cache_path() -> Path:
+    """Get the location of the refs cache file."""
+    cache_home = os.environ.get('XDG_CACHE_HOME')
+    base = Path(cache_home) if cache_home else Path.home() / '.cache'
+    return base / 'gitwip' / 'refs.json'
+
+
+def _mtime_ns(path: Path) -> int:
+    try:
+        return path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return 0
+
+
+def _dir_mtimes(path: Path) -> list[int]:
+    """Get the modification times of a directory and all of its subdirectories."""
+    try:
+        mtimes = [path.stat().st_mtime_ns]
+    except FileNotFoundError:
+        return []
+    with os.scandir(path) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                mtimes.extend(_dir_mtimes(Path(entry.path)))
+    return mtimes
+
+
+def refs_cache_key(git_dir: Path) -> list[int] | None:
+    """Build a key that changes whenever the branches or `origin/HEAD` of a repository may change.
+
+    Creating, renaming or deleting a loose ref updates the modification time of its parent
+    directory, so stat calls are enough to detect changes without reading any ref.
+    Returns None when the key cannot be built and the repository should not be cached.
+    """
+    try:
+        try:
+            common_dir = git_dir / (git_dir / 'commondir').read_text(encoding='utf-8').strip()
+        except FileNotFoundError:
+            common_dir = git_dir
+        return [
+            _mtime_ns(git_dir / 'HEAD'),
+            _mtime_ns(common_dir / 'packed-refs'),
+            _mtime_ns(common_dir / 'reftable'),
+            _mtime_ns(common_dir / 'refs' / 'remotes' / 'origin' / 'HEAD'),
+            *sorted(_dir_mtimes(common_dir / 'refs' / 'heads')),
+        ]
+    except OSError:
+        return None
+
+
+def _is_valid_entry(entry: object) -> bool:
+    """Check that a loaded cache entry has the shape of a `CacheEntry`."""
+    return (
+        isinstance(entry, dict)
+        and isinstance(entry.get('key'), list)
+        and isinstance(entry.get('branches'), list)
+        and all(isinstance(b, str) for b in entry['branches'])
+        and (entry.get('primary') is None or isinstance(entry.get('primary'), str))
+    )
+
+
+class RefsCache:
+    """Branches and primary branch of each repository from previous runs.
+
+    Entries are only reused while their key matches. Entries for repositories under the
+    scanned root that were not seen again are dropped on save.
+    """
+
+    def __init__(self, path: Path) -> None:
+        """Load the cache from path, starting empty if it is missing or unreadable.
+
+        Malformed entries are dropped, so they are treated as cache misses.
+        """
+        self.path = path
+        self._entries = self._load()
+        self._seen: dict[str, CacheEntry] = {}
+
+    def _load(self) -> dict[str, CacheEntry]:
+        try:
+            data = json.loads(self.path.read_text(encoding='utf-8'))
+        except (OSError, ValueError):
+            return {}
+        if not isinstance(data, dict) or data.get('version') != CACHE_VERSION:
+            return {}
+        entries = data.get('repos')
+        if not isinstance(entries, dict):
+            return {}
+        return {repo: entry for repo, entry in entries.items() if _is_valid_entry(entry)}
+
+    def get(self, repo: str, key: list[int]) -> tuple[list[str], str | None] | None:
+        """Get the cached refs of a repository if its key is unchanged."""
+        entry = self._entries.get(repo)
+        if entry is None or entry['key'] != key:
+            return None
+        self._seen[repo] = entry
+        return entry['branches'], entry['primary']
+
+    def put(self, repo: str, key: list[int], refs: tuple[list[str], str | None]) -> None:
+        """Store the refs of a repository."""
+        branches, primary = refs
+        self._seen[repo] = {'key': key, 'branches': branches, 'primary': primary}
+
+    def save(self, root: Path) -> None:
+        """Write the cache back to disk, replacing the entries under root with this run's."""
+        root_str = str(root)
+        root_prefix = root_str if root_str.endswith(os.sep) else root_str + os.sep
+        entries = {
+            repo: entry
+            for repo, entry in self._entries.items()
+            if repo != root_str and not repo.startswith(root_prefix)
+        }
+        entries.update(self._seen)
+        if entries == self._entries:
+            return
+
+        tmp_path = self.path.with_suffix(f'.{os.getpid()}.tmp')
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path.write_text(
+                json.dumps({'version': CACHE_VERSION, 'repos': entries}), encoding='utf-8'
+            )
+            tmp_path.replace(self.path)
+        except OSError:
+            pass  # the cache is only an optimization
@@ -4,7 +4,7 @@ import argparse
 import sys
 from pathlib import Path
 
-from gitwip.main import find_repos_with_branches, get_git_path, p
+from gitwip.main import DEFAULT_JOBS, find_repos_with_branches, get_git_path, p
 
 
 def parse_args() -> argparse.Namespace:
@@ -24,7 +24,22 @@ def parse_args() -> argparse.Namespace:
         default='git',
         help='Path to the `git` executable (default: use first found in PATH).',
     )
-    return parser.parse_args()
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=DEFAULT_JOBS,
+        help=f'Number of repositories to query in parallel (default: {DEFAULT_JOBS}).',
+    )
+    parser.add_argument(
+        '--no-cache',
+        action='store_true',
+        help='Do not read or update the refs cache (default: cache refs between runs).',
+    )
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error('--jobs must be a positive integer')
+    return args
 
 
 def cli() -> None:
@@ -32,7 +47,7 @@ def cli() -> None:
     args = parse_args()
     git_executable = args.git_path
 
-    git_path = get_git_path(git_executable)
+    git = get_git_path(git_executable).as_posix()
 
     root = args.path.expanduser().resolve()
     if not root.exists() or not root.is_dir():
@@ -40,7 +55,13 @@ def cli() -> None:
         sys.exit(1)
 
     skip_hidden_dirs = not args.include_hidden
-    find_repos_with_branches(root, git_path, skip_hidden_dirs=skip_hidden_dirs)
+    find_repos_with_branches(
+        root,
+        git,
+        skip_hidden_dirs=skip_hidden_dirs,
+        jobs=args.jobs,
+        use_cache=not args.no_cache,
+    )
 
 
 if __name__ == '__main__':
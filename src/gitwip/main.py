@@ -3,10 +3,31 @@
 import os
 import subprocess
 import sys
+from collections import deque
+from collections.abc import Collection, Iterable, Iterator
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
 from pathlib import Path
 from shutil import which
 
-from fortext import Fg, style
+from gitwip.cache import RefsCache, get_cache_path, refs_cache_key
+
+DEFAULT_JOBS = min(32, os.cpu_count() or 4)
+
+_FOR_EACH_REF_ARGS = (
+    'for-each-ref',
+    '--format=%(refname)%00%(symref)',
+    'refs/heads/',
+    'refs/remotes/origin/HEAD',
+)
+_REMOTE_URL_ARGS = ('remote', 'get-url', 'origin')
+
+_ANSI_BRIGHT_CYAN = '\x1b[96m'
+_ANSI_YELLOW = '\x1b[33m'
+_ANSI_RESET = '\x1b[0m'
+_HEADER_FMT = '=== {} ==='
+_BRANCH_FMT = '* {}'
+_COLOR_HEADER_FMT = f'{_ANSI_BRIGHT_CYAN}{_HEADER_FMT}{_ANSI_RESET}'
+_COLOR_BRANCH_FMT = f'{_ANSI_YELLOW}{_BRANCH_FMT}{_ANSI_RESET}'
 
 
 def p(*values: object) -> None:
@@ -34,106 +55,327 @@ def get_git_path(git_executable: str) -> Path:
         sys.exit(1)
 
 
-def get_git_repos(root: Path, *, skip_hidden_dirs: bool) -> list[Path]:
-    """Recursively find all directories under root that contain a `.git` folder."""
-    git_repos: list[Path] = []
-    for dirpath, dirnames, _ in os.walk(root):
-        if skip_hidden_dirs:
-            dirnames[:] = [d for d in dirnames if not d.startswith('.') or d == '.git']
-        if '.git' in dirnames:
-            git_repos.append(Path(dirpath))
-            dirnames.clear()
-    return git_repos
+def get_git_repos(root: Path, *, skip_hidden_dirs: bool) -> Iterator[Path]:
+    """Recursively find all directories under root that contain a `.git` folder.
+
+    Repositories are yielded as soon as they are found, in no particular order.
+    """
+    pending = deque([os.fspath(root)])
+    while pending:
+        dirpath = pending.pop()
+        subdirs: list[str] = []
+        try:
+            with os.scandir(dirpath) as it:
+                for entry in it:
+                    name = entry.name
+                    if name == '.git' and entry.is_dir():
+                        yield Path(dirpath)
+                        subdirs.clear()  # do not descend into repositories
+                        break
+                    if skip_hidden_dirs and name[0] == '.':
+                        continue
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.path)
+        except OSError:
+            continue
+        pending.extend(subdirs)
+
+
+def _dedupe_repos(repo_paths: Iterable[Path]) -> Iterator[Path]:
+    """Skip repositories that were already seen through another path (e.g. bind mounts).
+
+    Repositories are compared by their (device, inode) pair rather than by path.
+    """
+    seen: set[tuple[int, int]] = set()
+    for repo_path in repo_paths:
+        try:
+            st = repo_path.stat()
+        except OSError:
+            continue
+        key = (st.st_dev, st.st_ino)
+        if key not in seen:
+            seen.add(key)
+            yield repo_path
 
 
-def get_repo_branches(repo_path: Path, git_path: Path) -> list[str]:
-    """Get the list of branches in a Git repository."""
+def _pick_primary_branch(branches: Collection[str], origin_head: str | None) -> str | None:
+    """Pick the primary branch: the `origin/HEAD` target, else `main` or `master` if present.
+
+    Never hits the network: a missing `origin/HEAD` is not looked up on the remote.
+    """
+    if origin_head:
+        return origin_head
+    return next((b for b in ('main', 'master') if b in branches), None)
+
+
+def _find_git_dir(repo_path: Path) -> Path | None:
+    """Locate the Git directory of a repository.
+
+    A `.git` file with a `gitdir:` line is followed too, for callers that pass such a
+    directory directly; `get_git_repos` only yields repositories whose `.git` is a directory.
+    """
+    dot_git = repo_path / '.git'
     try:
-        result = subprocess.run(  # noqa: S603
-            [git_path.as_posix(), '-C', str(repo_path), 'branch', '--format=%(refname:short)'],
-            check=True,
-            capture_output=True,
-            text=True,
+        if dot_git.is_dir():
+            return dot_git
+        content = dot_git.read_text(encoding='utf-8').strip()
+    except OSError:
+        return None
+    if not content.startswith('gitdir:'):
+        return None
+    return repo_path / content.removeprefix('gitdir:').strip()
+
+
+def _scan_loose_branches(heads_dir: str, prefix: str = '') -> list[str]:
+    """Recursively list the loose branch refs stored under `refs/heads`."""
+    branches: list[str] = []
+    with os.scandir(heads_dir) as it:
+        for entry in it:
+            if entry.is_dir(follow_symlinks=False):
+                branches.extend(_scan_loose_branches(entry.path, f'{prefix}{entry.name}/'))
+            elif not entry.name.endswith('.lock'):
+                branches.append(f'{prefix}{entry.name}')
+    return branches
+
+
+def _read_packed_branches(git_dir: Path) -> list[str]:
+    """List the branch refs stored in `packed-refs`.
+
+    The file is parsed as bytes and only branch names are decoded, as most packed refs in
+    large repositories are tags and remote-tracking refs that are skipped anyway.
+    """
+    try:
+        content = (git_dir / 'packed-refs').read_bytes()
+    except FileNotFoundError:
+        return []
+    branches: list[str] = []
+    for line in content.splitlines():
+        # `<sha> <refname>` lines; the header and `^<sha>` peeled lines never match
+        _, _, refname = line.partition(b' ')
+        if refname.startswith(b'refs/heads/'):
+            branches.append(refname.removeprefix(b'refs/heads/').decode('utf-8', 'replace'))
+    return branches
+
+
+def _read_origin_head(git_dir: Path) -> str | None:
+    """Get the branch that the `origin/HEAD` symref points at."""
+    try:
+        symref = (git_dir / 'refs' / 'remotes' / 'origin' / 'HEAD').read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return None
+    if not symref.startswith('ref: refs/remotes/origin/'):
+        return None
+    return symref.removeprefix('ref: refs/remotes/origin/').strip() or None
+
+
+def read_refs_fast(repo_path: Path) -> tuple[list[str], str | None] | None:
+    """Get the local branches and the primary branch by reading ref files directly.
+
+    Returns None when the repository layout is not supported (reftable repositories,
+    linked worktrees, unreadable files), in which case git itself should be asked.
+    """
+    git_dir = _find_git_dir(repo_path)
+    if git_dir is None:
+        return None
+
+    try:
+        if (git_dir / 'commondir').exists() or (git_dir / 'reftable').exists():
+            return None
+        try:
+            branches = set(_scan_loose_branches(str(git_dir / 'refs' / 'heads')))
+        except FileNotFoundError:
+            branches = set()
+        branches.update(_read_packed_branches(git_dir))
+        origin_head = _read_origin_head(git_dir)
+    except OSError:
+        return None
+
+    return sorted(branches), _pick_primary_branch(branches, origin_head)
+
+
+def get_repo_refs(repo_path: Path, git: str) -> tuple[list[str], str | None]:
+    """Get the local branches and the primary branch of a Git repository.
+
+    Both are read from a single `git for-each-ref` call: the local branches and the
+    `origin/HEAD` symref, which points at the primary branch when the repository has a remote.
+    """
+    return _query_repo_refs(repo_path, git) or ([], None)
+
+
+def _query_repo_refs(repo_path: Path, git: str) -> tuple[list[str], str | None] | None:
+    """Like `get_repo_refs`, but return None when git fails."""
+    try:
+        output = subprocess.check_output(  # noqa: S603
+            [git, '-C', str(repo_path), *_FOR_EACH_REF_ARGS],
+            stderr=subprocess.DEVNULL,
         )
-        return [line.strip() for line in result.stdout.strip().splitlines()]
     except subprocess.CalledProcessError:
-        return []
+        return None
+
+    branches: list[str] = []
+    origin_head: str | None = None
+    for line in output.splitlines():
+        refname, _, symref = line.partition(b'\0')
+        if refname == b'refs/remotes/origin/HEAD':
+            head = symref.removeprefix(b'refs/remotes/origin/')
+            origin_head = head.decode('utf-8', 'replace') or None
+        else:
+            branches.append(refname.removeprefix(b'refs/heads/').decode('utf-8', 'replace'))
+
+    return branches, _pick_primary_branch(branches, origin_head)
 
 
-def get_repo_name(repo_path: Path, git_path: Path) -> str | None:
+def get_repo_name(repo_path: Path, git: str) -> str | None:
     """Try to extract a friendly name for a Git repository based on its remote origin URL."""
     try:
-        result = subprocess.run(  # noqa: S603
-            [git_path.as_posix(), '-C', str(repo_path), 'remote', 'get-url', 'origin'],
-            check=True,
-            capture_output=True,
-            text=True,
+        output = subprocess.check_output(  # noqa: S603
+            [git, '-C', str(repo_path), *_REMOTE_URL_ARGS],
+            stderr=subprocess.DEVNULL,
         )
-        url = result.stdout.strip()
-        url.removesuffix('.git')
+        url = output.strip().decode('utf-8', 'replace').removesuffix('.git')
         if '://' in url:
-            path = url.split('://')[1].split('/', 1)[1]
+            path = url.partition('://')[2].partition('/')[2]
         elif '@' in url:
-            path = url.split('@', 1)[1].split(':', 1)[1]
+            path = url.partition('@')[2].partition(':')[2]
         else:
             return repo_path.name
     except subprocess.CalledProcessError:
         return repo_path.name
     else:
-        return path
+        return path or repo_path.name
+
+
+def read_refs(repo_path: Path, git: str) -> tuple[list[str], str | None] | None:
+    """Get the local branches and the primary branch, asking git only if needed.
+
+    Returns None when neither the ref files nor git could read them.
+    """
+    refs = read_refs_fast(repo_path)
+    if refs is None:
+        refs = _query_repo_refs(repo_path, git)
+    return refs
+
+
+def read_refs_cached(
+    repo_path: Path, git: str, cache: RefsCache | None
+) -> tuple[list[str], str | None]:
+    """Get the local branches and the primary branch, reusing cached refs when unchanged.
+
+    Repositories whose cache key or refs cannot be read are not cached, and unreadable refs
+    are reported as no branches.
+    """
+    git_dir = _find_git_dir(repo_path) if cache is not None else None
+    key = refs_cache_key(git_dir) if git_dir is not None else None
+    if cache is None or key is None:
+        return read_refs(repo_path, git) or ([], None)
 
+    repo = str(repo_path)
+    refs = cache.get(repo, key)
+    if refs is None:
+        refs = read_refs(repo_path, git)
+        if refs is None:
+            return [], None
+        cache.put(repo, key, refs)
+    return refs
 
-def find_repos_with_branches(root: Path, git_path: Path, *, skip_hidden_dirs: bool) -> None:
+
+def get_non_primary_branches(
+    repo_path: Path, git: str, cache: RefsCache | None = None
+) -> list[str]:
+    """Get the branches of a Git repository, excluding its primary branch."""
+    all_branches, primary_branch = read_refs_cached(repo_path, git, cache)
+    return [b for b in all_branches if b != primary_branch]
+
+
+def _path_sort_key(path: str) -> str:
+    """Sort key that orders path strings the same way as `Path` objects, but cheaper.
+
+    Mapping the separator to NUL sorts `a/c` before `a-b`, matching the per-component
+    comparison that `Path` does.
+    """
+    return os.path.normcase(path).replace(os.sep, '\0')
+
+
+def _display_path(path: str, home_prefix: str) -> str:
+    """Shorten a path inside the home directory to start with `~`.
+
+    Uses plain string comparisons, as the paths are already canonical.
+    """
+    if path.startswith(home_prefix):
+        return f'~/{path[len(home_prefix) :]}'
+    if f'{path}{os.sep}' == home_prefix:
+        return '~'
+    return path
+
+
+def format_repo_branches(
+    repo_path: Path, git: str, home_prefix: str, cache: RefsCache | None, *, color: bool
+) -> str:
+    """Format the non-primary branches of a Git repository as a block of output lines.
+
+    Returns an empty string when the repository has no non-primary branches.
+    """
+    branches = get_non_primary_branches(repo_path, git, cache)
+    if not branches:
+        return ''
+    display_path = _display_path(str(repo_path), home_prefix)
+    header_fmt, branch_fmt = (
+        (_COLOR_HEADER_FMT, _COLOR_BRANCH_FMT) if color else (_HEADER_FMT, _BRANCH_FMT)
+    )
+    lines = [
+        header_fmt.format(display_path),
+        *(branch_fmt.format(branch) for branch in branches),
+        '',
+        '',
+    ]
+    return '\n'.join(lines)
+
+
+def find_repos_with_branches(
+    root: Path,
+    git: str,
+    *,
+    skip_hidden_dirs: bool,
+    jobs: int = DEFAULT_JOBS,
+    use_cache: bool = True,
+) -> None:
     """Find all Git repositories under root and print their non-primary branches."""
-    home = Path.home().resolve()
-    repo_paths = {p.resolve() for p in get_git_repos(root, skip_hidden_dirs=skip_hidden_dirs)}
-
-    for repo_path in sorted(repo_paths):
-        all_branches = get_repo_branches(repo_path, git_path)
-        primary_branch = get_primary_branch(repo_path, git_path)
-        branches = [b for b in all_branches if b != primary_branch]
-        if branches:
-            try:
-                display_path = f'~/{repo_path.relative_to(home)}'
-            except ValueError:
-                display_path = str(repo_path)
-            p(style(f'=== {display_path} ===', Fg.BRIGHT_CYAN))
-            for branch in branches:
-                p(style(f'* {branch}', Fg.YELLOW))
-            p()
-
-
-def get_primary_branch(repo_path: Path, git_path: Path) -> str | None:
-    """Get the name of the primary branch in a Git repository."""
-
-    def _run_git(args: list[str]) -> str | None:
-        try:
-            result = subprocess.run(  # noqa: S603
-                [git_path.as_posix(), '-C', str(repo_path), *args],
-                check=True,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.DEVNULL,  # suppress fatal messages
-                text=True,
-            )
-            return result.stdout.strip()
-        except subprocess.CalledProcessError:
-            return None
+    # root is already resolved and the walk does not follow symlinks, so discovered
+    # paths are canonical and can be compared against home as plain strings.
+    home_prefix = str(Path.home().resolve()) + os.sep
+    color = sys.stdout.isatty()
+    cache = RefsCache(get_cache_path()) if use_cache else None
+    repos = _dedupe_repos(get_git_repos(root, skip_hidden_dirs=skip_hidden_dirs))
 
-    # 1: origin/HEAD
-    ref = _run_git(['symbolic-ref', 'refs/remotes/origin/HEAD'])
-    if ref:
-        return ref.removeprefix('refs/remotes/origin/')
+    # git subprocesses release the GIL, so repositories can be queried concurrently.
+    # Repositories are submitted while the walk is still running, with the number of
+    # in-flight futures bounded so huge trees do not queue up unbounded work. Workers only
+    # build strings; output is sorted at the end and written with one call per repository.
+    max_pending = jobs * 4
+    blocks: dict[str, str] = {}
+    pending: dict[Future[str], Path] = {}
 
-    # 2️: remote show origin
-    output = _run_git(['remote', 'show', 'origin'])
-    if output:
-        for line in output.splitlines():
-            if 'HEAD branch:' in line:
-                return line.split(':', 1)[1].strip()
+    def collect(futures: Iterable[Future[str]]) -> None:
+        for future in futures:
+            block = future.result()
+            repo_path = pending.pop(future)
+            if block:
+                blocks[os.fspath(repo_path)] = block
+
+    with ThreadPoolExecutor(max_workers=jobs) as executor:
+        for repo_path in repos:
+            if len(pending) >= max_pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(
+                format_repo_branches, repo_path, git, home_prefix, cache, color=color
+            )
+            pending[future] = repo_path
+        collect(list(pending))
 
-    # 3️: main/master
-    for branch in ('main', 'master'):
-        if _run_git(['show-ref', '--verify', f'refs/heads/{branch}']):
-            return branch
+    if cache is not None:
+        cache.save(root)
 
-    return None
+    for repo_str in sorted(blocks, key=_path_sort_key):
+        sys.stdout.write(blocks[repo_str])
+    sys.stdout.flush()
@@ -0,0 +1,210 @@
+import json
+from collections.abc import Callable
+from pathlib import Path
+from typing import NoReturn
+
+import pytest
+
+from gitwip import cache, main
+from gitwip.cache import RefsCache, get_cache_path
+from gitwip.main import find_repos_with_branches, read_refs_cached
+
+from .conftest import git
+
+
+@pytest.fixture(autouse=True)
+def cache_home(tmp_path: Path, monkeypatch: pytest.MonkeyPatch) -> Path:
+    cache_home = tmp_path / 'cache'
+    monkeypatch.setenv('XDG_CACHE_HOME', str(cache_home))
+    return cache_home
+
+
+def scan(repo: Path, root: Path) -> tuple[list[str], str | None]:
+    """Read the refs of a repository through a fresh cache and save it, like one CLI run."""
+    cache = RefsCache(get_cache_path())
+    refs = read_refs_cached(repo, 'git', cache)
+    cache.save(root)
+    return refs
+
+
+def fail_uncached_reads(monkeypatch: pytest.MonkeyPatch) -> None:
+    def read_refs(repo_path: Path, git_executable: str) -> tuple[list[str], str | None]:
+        msg = f'refs of {repo_path} were not served from the cache'
+        raise AssertionError(msg)
+
+    monkeypatch.setattr(main, 'read_refs', read_refs)
+
+
+def test_cache_path_uses_xdg_cache_home(cache_home: Path) -> None:
+    assert get_cache_path() == cache_home / 'gitwip' / 'refs.json'
+
+
+def test_second_run_is_served_from_cache(
+    make_repo: Callable[..., Path], tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    repo = make_repo('repo', 'feature')
+    first = scan(repo, tmp_path)
+
+    fail_uncached_reads(monkeypatch)
+    assert scan(repo, tmp_path) == first == (['feature', 'main'], 'main')
+
+
+def test_creating_branch_invalidates_cache(make_repo: Callable[..., Path], tmp_path: Path) -> None:
+    repo = make_repo('repo', 'feature')
+    scan(repo, tmp_path)
+
+    git(repo, 'branch', 'new')
+    git(repo, 'branch', 'nested/new')
+    assert scan(repo, tmp_path) == (['feature', 'main', 'nested/new', 'new'], 'main')
+
+
+def test_deleting_loose_branch_invalidates_cache(
+    make_repo: Callable[..., Path], tmp_path: Path
+) -> None:
+    repo = make_repo('repo', 'feature', 'nested/x', 'nested/y')
+    scan(repo, tmp_path)
+
+    git(repo, 'branch', '-D', 'feature', 'nested/y')
+    assert scan(repo, tmp_path) == (['main', 'nested/x'], 'main')
+
+
+def test_packing_and_deleting_packed_branch_invalidates_cache(
+    make_repo: Callable[..., Path], tmp_path: Path
+) -> None:
+    repo = make_repo('repo', 'feature', 'other')
+    scan(repo, tmp_path)
+
+    git(repo, 'pack-refs', '--all')
+    assert scan(repo, tmp_path) == (['feature', 'main', 'other'], 'main')
+
+    git(repo, 'branch', '-D', 'feature')
+    assert scan(repo, tmp_path) == (['main', 'other'], 'main')
+
+
+def test_save_keeps_entries_outside_root(make_repo: Callable[..., Path], tmp_path: Path) -> None:
+    root = tmp_path / 'root'
+    repo = make_repo('root/repo', 'feature')
+    elsewhere = {'key': [1], 'branches': ['x'], 'primary': None}
+    stale = {'key': [1], 'branches': ['y'], 'primary': None}
+    cache_path = get_cache_path()
+    cache_path.parent.mkdir(parents=True)
+    cache_path.write_text(
+        json.dumps(
+            {
+                'version': 1,
+                'repos': {
+                    str(tmp_path / 'other' / 'repo'): elsewhere,
+                    str(tmp_path / 'root-sibling'): elsewhere,
+                    str(root / 'gone'): stale,
+                },
+            }
+        ),
+        encoding='utf-8',
+    )
+
+    scan(repo, root)
+
+    repos = json.loads(cache_path.read_text(encoding='utf-8'))['repos']
+    assert set(repos) == {
+        str(tmp_path / 'other' / 'repo'),
+        str(tmp_path / 'root-sibling'),
+        str(repo),
+    }
+    assert repos[str(tmp_path / 'other' / 'repo')] == elsewhere
+
+
+@pytest.mark.parametrize(
+    'content',
+    [
+        'not json',
+        '[]',
+        '{"version": 0, "repos": {}}',
+        '{"version": 1, "repos": []}',
+        '{"version": 1, "repos": {"REPO": {"branches": []}}}',
+        '{"version": 1, "repos": {"REPO": [1, 2]}}',
+        '{"version": 1, "repos": {"REPO": {"key": [1], "branches": [1], "primary": null}}}',
+        '{"version": 1, "repos": {"REPO": {"key": [1], "branches": [], "primary": 1}}}',
+    ],
+)
+def test_malformed_cache_is_ignored(
+    make_repo: Callable[..., Path],
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+    content: str,
+) -> None:
+    repo = make_repo('repo', 'feature')
+    cache_path = get_cache_path()
+    cache_path.parent.mkdir(parents=True)
+    cache_path.write_text(content.replace('REPO', str(repo)), encoding='utf-8')
+
+    assert RefsCache(cache_path).get(str(repo), [1]) is None
+
+    find_repos_with_branches(tmp_path, 'git', skip_hidden_dirs=True)
+    assert capsys.readouterr().out.endswith('* feature\n\n')
+
+
+def raise_permission_error(*args: object, **kwargs: object) -> NoReturn:
+    raise PermissionError(13, 'Permission denied')
+
+
+def cached_repos() -> dict[str, object]:
+    try:
+        content = get_cache_path().read_text(encoding='utf-8')
+    except FileNotFoundError:
+        return {}
+    return json.loads(content)['repos']
+
+
+@pytest.mark.parametrize('fail', ['dir_mtimes', 'git_dir'])
+def test_repo_without_cache_key_is_scanned_but_not_cached(
+    make_repo: Callable[..., Path],
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+    fail: str,
+) -> None:
+    make_repo('readable', 'feature')
+    unreadable = make_repo('unreadable', 'other')
+
+    if fail == 'dir_mtimes':
+        dir_mtimes = cache._dir_mtimes
+
+        def fail_dir_mtimes(path: Path) -> list[int]:
+            if path.is_relative_to(unreadable):
+                raise_permission_error()
+            return dir_mtimes(path)
+
+        monkeypatch.setattr(cache, '_dir_mtimes', fail_dir_mtimes)
+    else:
+        is_dir = Path.is_dir
+
+        # a repository directory that is readable but not searchable
+        def fail_is_dir(self: Path) -> bool:
+            if self == unreadable / '.git':
+                raise_permission_error()
+            return is_dir(self)
+
+        monkeypatch.setattr(Path, 'is_dir', fail_is_dir)
+
+    find_repos_with_branches(tmp_path, 'git', skip_hidden_dirs=True)
+
+    out = capsys.readouterr().out
+    assert '* feature\n' in out
+    assert '* other\n' in out
+    assert set(cached_repos()) == {str(tmp_path / 'readable')}
+
+
+def test_repo_with_unreadable_refs_is_skipped_and_not_cached(
+    make_repo: Callable[..., Path],
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    make_repo('repo', 'feature')
+    monkeypatch.setattr(main, '_scan_loose_branches', raise_permission_error)
+
+    # `false` stands in for a git that cannot read the repository either
+    find_repos_with_branches(tmp_path, 'false', skip_hidden_dirs=True)
+
+    assert capsys.readouterr().out == ''
+    assert cached_repos() == {}
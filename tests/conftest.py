@@ -0,0 +1,42 @@
+import os
+import subprocess
+from collections.abc import Callable
+from pathlib import Path
+
+import pytest
+
+GIT_ENV = {
+    'GIT_AUTHOR_NAME': 'gitwip',
+    'GIT_AUTHOR_EMAIL': 'gitwip@example.com',
+    'GIT_COMMITTER_NAME': 'gitwip',
+    'GIT_COMMITTER_EMAIL': 'gitwip@example.com',
+    'GIT_CONFIG_NOSYSTEM': '1',
+}
+
+
+def git(repo: Path, *args: str) -> str:
+    """Run git in a repository and return its output."""
+    result = subprocess.run(
+        ['git', '-C', str(repo), *args],
+        check=True,
+        capture_output=True,
+        text=True,
+        env={**os.environ, **GIT_ENV},
+    )
+    return result.stdout
+
+
+@pytest.fixture
+def make_repo(tmp_path: Path) -> Callable[..., Path]:
+    """Create a Git repository with an initial commit and the given extra branches."""
+
+    def _make_repo(name: str, *branches: str, primary: str = 'main') -> Path:
+        repo = tmp_path / name
+        repo.mkdir(parents=True)
+        git(repo, 'init', '-q', '-b', primary)
+        git(repo, 'commit', '-q', '--allow-empty', '-m', 'init')
+        for branch in branches:
+            git(repo, 'branch', branch)
+        return repo
+
+    return _make_repo
@@ -0,0 +1,285 @@
+from collections.abc import Callable
+from pathlib import Path
+from typing import NoReturn
+
+import pytest
+
+from gitwip import main
+from gitwip.main import (
+    _display_path,
+    _path_sort_key,
+    find_repos_with_branches,
+    format_repo_branches,
+    get_git_repos,
+    get_repo_name,
+    get_repo_refs,
+    read_refs,
+    read_refs_fast,
+)
+
+from .conftest import git
+
+
+def loose(make_repo: Callable[..., Path]) -> Path:
+    return make_repo('repo', 'feature', 'other')
+
+
+def packed(make_repo: Callable[..., Path]) -> Path:
+    repo = make_repo('repo', 'feature', 'other')
+    git(repo, 'pack-refs', '--all')
+    return repo
+
+
+def mixed(make_repo: Callable[..., Path]) -> Path:
+    repo = make_repo('repo', 'feature', 'other')
+    git(repo, 'pack-refs', '--all')
+    git(repo, 'branch', 'loose')
+    git(repo, 'branch', '-D', 'other')
+    # a branch that is both packed and loose must only be listed once
+    git(repo, 'update-ref', 'refs/heads/feature', 'HEAD')
+    return repo
+
+
+def nested(make_repo: Callable[..., Path]) -> Path:
+    repo = make_repo('repo', 'feature/x', 'feature/deep/y', 'fix')
+    git(repo, 'pack-refs', '--all')
+    git(repo, 'branch', 'feature/z')
+    return repo
+
+
+def cloned(make_repo: Callable[..., Path]) -> Path:
+    upstream = make_repo('upstream', 'feature', primary='trunk')
+    repo = upstream.parent / 'repo'
+    git(upstream.parent, 'clone', '-q', str(upstream), str(repo))
+    git(repo, 'branch', 'wip')
+    return repo
+
+
+def no_primary(make_repo: Callable[..., Path]) -> Path:
+    return make_repo('repo', 'feature', primary='trunk')
+
+
+def stray_lock(make_repo: Callable[..., Path]) -> Path:
+    repo = make_repo('repo', 'feature')
+    (repo / '.git' / 'refs' / 'heads' / 'x.lock').write_text('', encoding='utf-8')
+    return repo
+
+
+@pytest.mark.parametrize('layout', [loose, packed, mixed, nested, cloned, no_primary, stray_lock])
+def test_read_refs_fast_matches_git(
+    make_repo: Callable[..., Path], layout: Callable[[Callable[..., Path]], Path]
+) -> None:
+    repo = layout(make_repo)
+    assert read_refs_fast(repo) == get_repo_refs(repo, 'git')
+
+
+def test_read_refs_fast_reads_origin_head(make_repo: Callable[..., Path]) -> None:
+    repo = cloned(make_repo)
+    assert read_refs_fast(repo) == (['trunk', 'wip'], 'trunk')
+
+
+def test_read_refs_fast_defers_worktrees_to_git(make_repo: Callable[..., Path]) -> None:
+    repo = make_repo('repo', 'feature')
+    worktree = repo.parent / 'worktree'
+    git(repo, 'worktree', 'add', '-q', str(worktree), '-b', 'wt')
+    assert read_refs_fast(worktree) is None
+    assert get_repo_refs(worktree, 'git') == (['feature', 'main', 'wt'], 'main')
+
+
+def raise_permission_error(*args: object, **kwargs: object) -> NoReturn:
+    raise PermissionError(13, 'Permission denied')
+
+
+def raise_for_name(name: str, method: Callable[..., object]) -> Callable[..., object]:
+    """Wrap a `Path` method so that it raises `PermissionError` for paths with the given name."""
+
+    def wrapper(self: Path, *args: object, **kwargs: object) -> object:
+        if self.name == name:
+            raise_permission_error()
+        return method(self, *args, **kwargs)
+
+    return wrapper
+
+
+@pytest.mark.parametrize(
+    'target',
+    ['_scan_loose_branches', '_read_packed_branches', '_read_origin_head'],
+)
+def test_read_refs_fast_returns_none_on_os_error(
+    make_repo: Callable[..., Path], monkeypatch: pytest.MonkeyPatch, target: str
+) -> None:
+    repo = cloned(make_repo)
+    monkeypatch.setattr(main, target, raise_permission_error)
+    assert read_refs_fast(repo) is None
+    assert read_refs(repo, 'git') == get_repo_refs(repo, 'git') == (['trunk', 'wip'], 'trunk')
+
+
+@pytest.mark.parametrize(('method', 'name'), [('exists', 'commondir'), ('is_dir', '.git')])
+def test_read_refs_fast_returns_none_on_unreadable_git_dir(
+    make_repo: Callable[..., Path], monkeypatch: pytest.MonkeyPatch, method: str, name: str
+) -> None:
+    repo = make_repo('repo', 'feature')
+    monkeypatch.setattr(Path, method, raise_for_name(name, getattr(Path, method)))
+    assert read_refs_fast(repo) is None
+    assert read_refs(repo, 'git') == get_repo_refs(repo, 'git') == (['feature', 'main'], 'main')
+
+
+@pytest.mark.parametrize(
+    ('url', 'expected'),
+    [
+        ('https://host/owner/repo.git', 'owner/repo'),
+        ('https://host/owner/repo', 'owner/repo'),
+        ('git@host:owner/repo.git', 'owner/repo'),
+        ('https://host', 'checkout'),
+        ('/some/local/path', 'checkout'),
+    ],
+)
+def test_get_repo_name(make_repo: Callable[..., Path], url: str, expected: str) -> None:
+    repo = make_repo('checkout')
+    git(repo, 'remote', 'add', 'origin', url)
+    assert get_repo_name(repo, 'git') == expected
+
+
+def test_get_repo_name_without_remote(make_repo: Callable[..., Path]) -> None:
+    assert get_repo_name(make_repo('checkout'), 'git') == 'checkout'
+
+
+def make_dirs(root: Path, *paths: str) -> None:
+    for path in paths:
+        (root / path).mkdir(parents=True)
+
+
+def find_repos(root: Path, *, skip_hidden_dirs: bool = True) -> list[Path]:
+    return sorted(get_git_repos(root, skip_hidden_dirs=skip_hidden_dirs))
+
+
+def test_get_git_repos_does_not_descend_into_repos(tmp_path: Path) -> None:
+    make_dirs(tmp_path, 'a/.git', 'a/sub/nested/.git', 'b/c/.git', 'b/c/d/.git', 'empty/dir')
+    assert find_repos(tmp_path) == [tmp_path / 'a', tmp_path / 'b' / 'c']
+
+
+def test_get_git_repos_root_is_repo(tmp_path: Path) -> None:
+    make_dirs(tmp_path, '.git', 'nested/.git')
+    assert find_repos(tmp_path) == [tmp_path]
+
+
+def test_get_git_repos_skips_hidden_dirs(tmp_path: Path) -> None:
+    make_dirs(tmp_path, 'visible/.git', '.hidden/repo/.git', 'x/.config/repo/.git')
+    assert find_repos(tmp_path) == [tmp_path / 'visible']
+    assert find_repos(tmp_path, skip_hidden_dirs=False) == [
+        tmp_path / '.hidden' / 'repo',
+        tmp_path / 'visible',
+        tmp_path / 'x' / '.config' / 'repo',
+    ]
+
+
+def test_get_git_repos_ignores_git_files(tmp_path: Path) -> None:
+    make_dirs(tmp_path, 'submodule')
+    (tmp_path / 'submodule' / '.git').write_text('gitdir: ../.git/modules/x', encoding='utf-8')
+    assert find_repos(tmp_path) == []
+
+
+def test_get_git_repos_symlinks(tmp_path: Path) -> None:
+    root = tmp_path / 'root'
+    outside = tmp_path / 'outside'
+    make_dirs(tmp_path, 'root/linked_git', 'outside/repo/.git', 'outside/real_git')
+    # a `.git` that is a symlink to a directory marks a repository
+    (root / 'linked_git' / '.git').symlink_to(outside / 'real_git', target_is_directory=True)
+    # symlinked directories are not walked, even when they lead to repositories
+    (root / 'linked_dir').symlink_to(outside, target_is_directory=True)
+    (root / 'linked_repo').symlink_to(outside / 'repo', target_is_directory=True)
+    assert find_repos(root) == [root / 'linked_git']
+
+
+@pytest.mark.parametrize(
+    ('path', 'expected'),
+    [
+        ('/home/user', '~'),
+        ('/home/user/code/repo', '~/code/repo'),
+        ('/home/userx', '/home/userx'),
+        ('/home/userx/repo', '/home/userx/repo'),
+        ('/srv/repo', '/srv/repo'),
+    ],
+)
+def test_display_path(path: str, expected: str) -> None:
+    assert _display_path(path, '/home/user/') == expected
+
+
+def test_path_sort_key_matches_path_order() -> None:
+    paths = [
+        '/x/a-b',
+        '/x/a/c',
+        '/x/a',
+        '/x/a b/c',
+        '/x/ab',
+        '/x/a.b/z',
+        '/x/a/c/d',
+        '/x/B',
+        '/x/b',
+        '/y',
+    ]
+    expected = [str(p) for p in sorted(map(Path, paths))]
+    assert sorted(paths, key=_path_sort_key) == expected
+    assert expected.index('/x/a/c') < expected.index('/x/a-b')
+    assert sorted(paths) != expected  # plain string order differs
+
+
+def make_output_tree(make_repo: Callable[..., Path]) -> Path:
+    a = make_repo('root/a', 'other', 'feature')
+    make_repo('root/b')
+    make_repo('root/c/d', 'wip', primary='trunk')
+    return a.parent
+
+
+def test_redirected_output(
+    make_repo: Callable[..., Path],
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    root = make_output_tree(make_repo)
+    monkeypatch.setenv('HOME', str(tmp_path / 'home'))
+
+    find_repos_with_branches(root, 'git', skip_hidden_dirs=True, use_cache=False)
+
+    assert capsys.readouterr().out == (
+        f'=== {root / "a"} ===\n'
+        '* feature\n'
+        '* other\n'
+        '\n'
+        f'=== {root / "c" / "d"} ===\n'
+        '* trunk\n'
+        '* wip\n'
+        '\n'
+    )
+
+
+def test_redirected_output_under_home(
+    make_repo: Callable[..., Path],
+    tmp_path: Path,
+    capsys: pytest.CaptureFixture[str],
+    monkeypatch: pytest.MonkeyPatch,
+) -> None:
+    root = make_output_tree(make_repo)
+    monkeypatch.setenv('HOME', str(tmp_path))
+
+    find_repos_with_branches(root, 'git', skip_hidden_dirs=True, use_cache=False)
+
+    out = capsys.readouterr().out
+    assert out.startswith('=== ~/root/a ===\n* feature\n')
+    assert '\x1b[' not in out
+
+
+def test_colored_output(make_repo: Callable[..., Path]) -> None:
+    repo = make_repo('repo', 'feature', 'other')
+
+    block = format_repo_branches(repo, 'git', '/nonexistent/', None, color=True)
+
+    assert block == (
+        f'\x1b[96m=== {repo} ===\x1b[0m\n\x1b[33m* feature\x1b[0m\n\x1b[33m* other\x1b[0m\n\n'
+    )
+
+
+def test_no_output_without_non_primary_branches(make_repo: Callable[..., Path]) -> None:
+    repo = make_repo('repo')
+    assert format_repo_branches(repo, 'git', '/nonexistent/', None, color=True) == ''